@@ -223,28 +223,115 @@ def fake_source(
     if len(examples) == 0:
         raise ValueError("examples cannot be empty")
 
+    # If None, attempt to infer spec from elements.
+    output_signature = spec or tf.nest.map_structure(tf.type_spec_from_value, examples[0])
+
     def data_gen():
         for _ in range(repeat):
             for e in examples:
                 yield e
 
     def fn() -> tf.data.Dataset:
-        ds = tf.data.Dataset.from_generator(
-            data_gen,
-            # If None, attempt to infer spec from elements.
-            output_signature=spec or tf.nest.map_structure(tf.type_spec_from_value, examples[0]),
-        )
+        stacked = _stack_examples(examples, output_signature)
+        if stacked is None:
+            ds = tf.data.Dataset.from_generator(data_gen, output_signature=output_signature)
+        else:
+            # Index into the pre-stacked examples in-graph, rather than yielding them from Python.
+            # Note that slicing ragged tensors with from_tensor_slices yields ragged elements,
+            # whereas indexing a row (with ragged_rank=1) yields a dense tensor.
+            def get_example(index: tf.Tensor):
+                return tf.nest.map_structure(
+                    # Restore the expected (possibly less specific) shape.
+                    lambda x, x_spec: tf.compat.v1.placeholder_with_default(
+                        x[index], shape=x_spec.shape
+                    ),
+                    stacked,
+                    output_signature,
+                )
+
+            ds = tf.data.Dataset.range(len(examples)).map(get_example)
+            # Match data_gen, which yields nothing if repeat <= 0.
+            ds = ds.repeat(max(repeat, 0))
         if is_training:
             ds = ds.repeat()
         if shuffle_buffer_size:
             if not is_training:
                 raise ValueError("Shuffling should be disabled if is_training=False")
             ds = ds.shuffle(shuffle_buffer_size)
-        return ds
+        return ds.with_options(_fake_source_options())
 
     return fn
 
 
+def _stack_examples(
+    examples: Sequence[Dict[str, Any]], output_signature: Dict[str, tf.TypeSpec]
+) -> Optional[Dict[str, Union[tf.Tensor, tf.RaggedTensor]]]:
+    """Stacks examples along a new leading dim, so that they can be indexed in-graph.
+
+    Args:
+        examples: The examples to stack.
+        output_signature: The expected spec of each example.
+
+    Returns:
+        The stacked examples, or None if they cannot be stacked such that each row is a dense
+        tensor matching `output_signature` (e.g. examples contain ragged tensors, have variable
+        inner dims, or do not match the spec). In the latter case, the caller falls back to
+        `from_generator`, which raises on mismatches while iterating.
+    """
+    for example in examples:
+        try:
+            tf.nest.assert_same_structure(output_signature, example)
+        except (TypeError, ValueError):
+            return None
+    flat_specs = tf.nest.flatten(output_signature)
+    flat_examples = [tf.nest.flatten(example) for example in examples]
+    stacked = []
+    for i, x_spec in enumerate(flat_specs):
+        if not isinstance(x_spec, tf.TensorSpec):
+            return None
+        values = []
+        for flat_example in flat_examples:
+            if isinstance(flat_example[i], (tf.RaggedTensor, tf.SparseTensor)):
+                return None
+            try:
+                value = tf.convert_to_tensor(flat_example[i], dtype=x_spec.dtype)
+            except (TypeError, ValueError):
+                # E.g. the example has a different dtype than the spec.
+                return None
+            if not x_spec.shape.is_compatible_with(value.shape):
+                return None
+            values.append(value)
+        shapes = [tuple(v.shape.as_list()) for v in values]
+        if len(set(shapes)) == 1:
+            stacked.append(tf.stack(values))
+        elif all(shapes) and len({shape[1:] for shape in shapes}) == 1:
+            # Only the leading dim varies, so each row is still dense.
+            stacked.append(
+                tf.RaggedTensor.from_row_lengths(
+                    tf.concat(values, 0), row_lengths=[shape[0] for shape in shapes]
+                )
+            )
+        else:
+            return None
+    return tf.nest.pack_sequence_as(output_signature, stacked)
+
+
+def _fake_source_options() -> tf.data.Options:
+    """Returns tf.data options for datasets built on fake sources.
+
+    Enables map fusion and parallel batching (which are off by default), and limits intra-op
+    parallelism to 1.
+    """
+    options = tf.data.Options()
+    options.experimental_optimization.map_fusion = True
+    options.experimental_optimization.parallel_batch = True
+    # Keep each op single-threaded. Datasets share the default inter-op threadpool, rather than
+    # each getting a private one, since tests may build many of them in parallel (e.g. under
+    # pytest-xdist).
+    options.threading.max_intra_op_parallelism = 1
+    return options
+
+
 def fake_text_source(
     *,
     text_field_name: str = "text",
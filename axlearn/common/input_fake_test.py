@@ -0,0 +1,101 @@
+# Copyright © 2023 Apple Inc.
+
+"""Tests fake inputs."""
+# pylint: disable=protected-access
+import tensorflow as tf
+from absl.testing import absltest, parameterized
+
+from axlearn.common.input_fake import _stack_examples, fake_source
+
+
+class FakeSourceTest(parameterized.TestCase, tf.test.TestCase):
+    def test_stack_dense(self):
+        examples = [{"a": tf.constant([1, 2])}, {"a": tf.constant([3, 4])}]
+        stacked = _stack_examples(examples, {"a": tf.TensorSpec([2], dtype=tf.int32)})
+        self.assertIsInstance(stacked["a"], tf.Tensor)
+        self.assertAllEqual([[1, 2], [3, 4]], stacked["a"])
+
+    def test_stack_ragged_leading_dim(self):
+        examples = [{"a": tf.constant([[1, 2]])}, {"a": tf.constant([[3, 4], [5, 6]])}]
+        stacked = _stack_examples(examples, {"a": tf.TensorSpec([None, 2], dtype=tf.int32)})
+        self.assertIsInstance(stacked["a"], tf.RaggedTensor)
+        self.assertAllEqual([[1, 2]], stacked["a"][0])
+        self.assertAllEqual([[3, 4], [5, 6]], stacked["a"][1])
+
+    @parameterized.parameters(
+        # Ragged inputs.
+        dict(
+            examples=[{"a": tf.ragged.constant([[1], [2, 3]])}],
+            spec={"a": tf.RaggedTensorSpec([None, None], dtype=tf.int32)},
+        ),
+        # Inner dims vary across examples.
+        dict(
+            examples=[{"a": tf.constant([[1]])}, {"a": tf.constant([[1, 2]])}],
+            spec={"a": tf.TensorSpec([None, None], dtype=tf.int32)},
+        ),
+        # Keys do not match the spec.
+        dict(
+            examples=[{"a": tf.constant([1]), "c": tf.constant([2])}],
+            spec={
+                "a": tf.TensorSpec([None], dtype=tf.int32),
+                "b": tf.TensorSpec([None], dtype=tf.int32),
+            },
+        ),
+        # Shapes do not match the spec.
+        dict(
+            examples=[{"a": tf.constant([1, 2, 3])}],
+            spec={"a": tf.TensorSpec([2], dtype=tf.int32)},
+        ),
+    )
+    def test_stack_fallback(self, examples, spec):
+        self.assertIsNone(_stack_examples(examples, spec))
+
+    @parameterized.parameters(
+        # Stacked dense.
+        dict(
+            examples=[{"a": tf.constant([1, 2])}, {"a": tf.constant([3, 4])}],
+            spec={"a": tf.TensorSpec([2], dtype=tf.int32)},
+        ),
+        # Stacked with a ragged leading dim.
+        dict(
+            examples=[{"a": tf.constant([1])}, {"a": tf.constant([2, 3, 4])}],
+            spec={"a": tf.TensorSpec([None], dtype=tf.int32)},
+        ),
+        # Generator fallback.
+        dict(
+            examples=[{"a": tf.ragged.constant([[1], [2, 3]])}],
+            spec={"a": tf.RaggedTensorSpec([None, None], dtype=tf.int32)},
+        ),
+    )
+    def test_fake_source(self, examples, spec):
+        for repeat in (0, 1, 2):
+            ds = fake_source(is_training=False, examples=examples, repeat=repeat, spec=spec)()
+            actual = list(ds)
+            self.assertLen(actual, len(examples) * repeat)
+            for expected, example in zip(examples * repeat, actual):
+                self.assertAllEqual(expected["a"], example["a"])
+
+    @parameterized.parameters(
+        # Keys do not match the spec.
+        dict(
+            examples=[{"a": tf.constant([1]), "c": tf.constant([2])}],
+            spec={
+                "a": tf.TensorSpec([None], dtype=tf.int32),
+                "b": tf.TensorSpec([None], dtype=tf.int32),
+            },
+        ),
+        # Shapes do not match the spec.
+        dict(
+            examples=[{"a": tf.constant([1, 2, 3])}],
+            spec={"a": tf.TensorSpec([2], dtype=tf.int32)},
+        ),
+    )
+    def test_fake_source_spec_mismatch(self, examples, spec):
+        # Building the dataset succeeds; the mismatch is only raised while iterating.
+        ds = fake_source(is_training=False, examples=examples, spec=spec)()
+        with self.assertRaises(tf.errors.InvalidArgumentError):
+            list(ds)
+
+
+if __name__ == "__main__":
+    absltest.main()
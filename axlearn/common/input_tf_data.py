@@ -748,7 +748,7 @@ def rekey(
 
     Args:
         key_map: dictionary mapping new keys to original keys.
-            If falsey, return input (to match seqio behavior).
+            If falsey, return the input dataset as is (to match seqio behavior).
         default_value: value to set new key to if old key-value doesn't exist.
             If None, then we do not write the new key-value pair when missing an old key-value
                 or when the provided reference key is falsey (to match seqio).
@@ -759,9 +759,11 @@ def rekey(
         A DatasetToDatasetFn, where each input example should be a dict.
     """
 
+    if not key_map:
+        # Avoid inserting a no-op map into the dataset.
+        return identity()
+
     def fn(example: Dict[str, tf.Tensor]) -> Dict[str, tf.Tensor]:
-        if not key_map:
-            return example
         output = example if retain_original_inputs else {}
         for new_key, old_key in key_map.items():
             if not old_key or old_key not in example:
@@ -838,7 +840,15 @@ def ragged_to_tensor(feature_shapes: Dict[str, Any], default_value: int = 0) ->
                 example[k] = v.to_tensor(default_value=default_value, shape=feature_shapes[k])
         return example
 
-    return seqio.map_over_dataset(fn)
+    def process_dataset_fn(ds: tf.data.Dataset) -> tf.data.Dataset:
+        # Avoid a per-example map if none of the specified features are ragged.
+        if isinstance(ds.element_spec, dict) and not any(
+            isinstance(ds.element_spec.get(k), tf.RaggedTensorSpec) for k in feature_shapes
+        ):
+            return ds
+        return ds.map(fn, num_parallel_calls=tf.data.AUTOTUNE)
+
+    return process_dataset_fn
 
 
 class Input(Module):
@@ -982,6 +992,17 @@ def pad_to_batch(batch_size: int, pad_value: int = 0) -> DatasetToDatasetFn:
         A DatasetToDatasetFn that pads to the batch size.
     """
 
+    pad_fn = _pad_tensor_to_batch_fn(batch_size, pad_value=pad_value)
+
+    def process_example_fn(example: Dict[str, tf.Tensor]):
+        return tf.nest.map_structure(pad_fn, example)
+
+    return seqio.map_over_dataset(process_example_fn)
+
+
+def _pad_tensor_to_batch_fn(batch_size: int, pad_value: int) -> Callable[[tf.Tensor], tf.Tensor]:
+    """Returns a function that pads a single tensor along the first (batch) dimension."""
+
     def pad_fn(v: tf.Tensor):
         paddings = [
             [[0, batch_size - tf.shape(v)[0]]],
@@ -989,10 +1010,7 @@ def pad_to_batch(batch_size: int, pad_value: int = 0) -> DatasetToDatasetFn:
         ]
         return tf.pad(v, paddings=tf.concat(paddings, 0), constant_values=pad_value)
 
-    def process_example_fn(example: Dict[str, tf.Tensor]):
-        return tf.nest.map_structure(pad_fn, example)
-
-    return seqio.map_over_dataset(process_example_fn)
+    return pad_fn
 
 
 def pack_to_batch(batch_size: int, pad_value: int = 0) -> DatasetToDatasetFn:
@@ -1031,6 +1049,37 @@ def pack_to_batch(batch_size: int, pad_value: int = 0) -> DatasetToDatasetFn:
         batch_size: Desired batch size.
         pad_value: Value to pad to batch size, if there is a remainder.
 
+    Returns:
+        A DatasetToDatasetFn that packs to the batch size.
+    """
+    return _pack_to_batch(batch_size, pad_value=pad_value, trim=False)
+
+
+def trim_and_pack_to_batch(batch_size: int, pad_value: int = 0) -> DatasetToDatasetFn:
+    """Trims and packs along the first (batch) dimension.
+
+    Equivalent to `chain(trim_to_batch(batch_size), pack_to_batch(batch_size))`, except that
+    elements are trimmed within the same pass that packs them.
+
+    Args:
+        batch_size: Desired batch size.
+        pad_value: Value to pad to batch size, if there is a remainder.
+
+    Returns:
+        A DatasetToDatasetFn that trims and packs to the batch size.
+    """
+    return _pack_to_batch(batch_size, pad_value=pad_value, trim=True)
+
+
+def _pack_to_batch(batch_size: int, *, pad_value: int, trim: bool) -> DatasetToDatasetFn:
+    """Implements `pack_to_batch` and `trim_and_pack_to_batch`.
+
+    Args:
+        batch_size: Desired batch size.
+        pad_value: Value to pad to batch size, if there is a remainder.
+        trim: Whether to trim elements exceeding `batch_size` prior to packing them.
+            If False, such elements raise an error.
+
     Returns:
         A DatasetToDatasetFn that packs to the batch size.
     """
@@ -1044,6 +1093,8 @@ def pack_to_batch(batch_size: int, pad_value: int = 0) -> DatasetToDatasetFn:
         )
 
     def scan_fn(carry: Dict[str, Any], elem: Dict[str, tf.Tensor]):
+        if trim:
+            elem = {k: x[:batch_size] for k, x in elem.items()}
         out = {}
         # Produce a new batch if any field cannot be packed any further.
         flush = tf.reduce_any(
@@ -1069,10 +1120,15 @@ def pack_to_batch(batch_size: int, pad_value: int = 0) -> DatasetToDatasetFn:
             carry[k] = state
         return carry, out
 
-    def define_shape(element_spec: Any, batch_size: int):
+    pad_fn = _pad_tensor_to_batch_fn(batch_size, pad_value=pad_value)
+
+    def pad_and_define_shape(element_spec: Any):
+        # Pads and sets shapes in a single map, rather than one map for each.
         def fn(example: Dict[str, tf.Tensor]):
             for k, t in example.items():
+                t = pad_fn(t)
                 t.set_shape((batch_size, *element_spec[k].shape.as_list()[1:]))
+                example[k] = t
             return example
 
         return seqio.map_over_dataset(fn)
@@ -1093,11 +1149,10 @@ def pack_to_batch(batch_size: int, pad_value: int = 0) -> DatasetToDatasetFn:
         ds = ds.scan(initial_state=state, scan_func=scan_fn)
         # Remove dummy outputs.
         ds = ds.filter(lambda x: tf.reduce_all([tf.shape(v)[0] != 0 for v in x.values()]))
-        # Pad the rest to fixed batch.
-        ds = pad_to_batch(batch_size, pad_value=pad_value)(ds)
-        # Apply shapes back due to scan leaving shapes <unknown>.
-        ds = define_shape(element_spec, batch_size)(ds)
-        return ds
+        # Pad the rest to fixed batch, and apply shapes back due to scan leaving shapes <unknown>.
+        ds = pad_and_define_shape(element_spec)(ds)
+        # Packing is sequential, so overlap it with downstream consumers.
+        return ds.prefetch(tf.data.AUTOTUNE)
 
     return fn
 
@@ -1130,15 +1185,14 @@ def trim_and_pad_tensor(
         A tensor whose last dimension is trimmed and padded.
     """
     if isinstance(t, tf.RaggedTensor):
-        shape = t.bounding_shape()
-        t = t.to_tensor(default_value=pad_id)
+        # Trim and pad in a single ragged-to-dense conversion.
+        # Leading dims of None are inferred from the bounding shape.
+        t = t.to_tensor(default_value=pad_id, shape=t.shape[:-1].as_list() + [max_len])
     else:
-        shape = tf.shape(t)
-
-    t = t[..., :max_len]
-    pad_amt = max_len - shape[-1]
-    if pad_amt > 0:
-        t = tf.pad(t, [(0, 0)] * (len(t.shape) - 1) + [(0, pad_amt)], constant_values=pad_id)
+        t = t[..., :max_len]
+        pad_amt = max_len - tf.shape(t)[-1]
+        if pad_amt > 0:
+            t = tf.pad(t, [(0, 0)] * (len(t.shape) - 1) + [(0, pad_amt)], constant_values=pad_id)
     t = tf.ensure_shape(t, t.shape[:-1] + [max_len])
 
     return t
@@ -2,9 +2,10 @@
 
 """Tests tf.data inputs."""
 # pylint: disable=no-self-use,too-many-lines
-from typing import Dict, List, Optional, Sequence, Type, Union
+from typing import Any, Dict, List, Optional, Sequence, Type, Union
 
 import jax
+import numpy as np
 import pytest
 import seqio
 import tensorflow as tf
@@ -12,7 +13,7 @@ import tensorflow_datasets as tfds
 from absl.testing import absltest, parameterized
 
 from axlearn.common import test_utils
-from axlearn.common.config import config_for_function
+from axlearn.common.config import InstantiableConfig, config_for_function
 from axlearn.common.input_fake import fake_serialized_json_source, fake_source, fake_text_source
 from axlearn.common.input_tf_data import (
     BuildDatasetFn,
@@ -37,6 +38,7 @@ from axlearn.common.input_tf_data import (
     squeeze_fields,
     tfds_dataset,
     tfds_read_config,
+    trim_and_pack_to_batch,
     trim_and_pad_tensor,
     trim_to_batch,
     unpack,
@@ -50,36 +52,31 @@ def build_ds_fn(
     del is_training, data_dir
 
     def ds_fn() -> tf.data.Dataset:
-        def data_gen():
-            for text in texts:
-                yield text
-
-        ds = tf.data.Dataset.from_generator(data_gen, output_types=tf.string)
-        # Set the cardinality of the generated dataset.
-        ds = ds.apply(tf.data.experimental.assert_cardinality(len(texts)))
-        return ds
+        # Slicing a constant keeps the pipeline in-graph and gives a statically known cardinality.
+        return tf.data.Dataset.from_tensor_slices(tf.constant(list(texts), dtype=tf.string))
 
     return ds_fn
 
 
+def _default_sources() -> List[InstantiableConfig]:
+    return [
+        config_for_function(build_ds_fn).set(texts=texts)
+        for texts in (["a", "b", "c", "d", "e"], ["g", "h"], ["w", "x", "y", "z"])
+    ]
+
+
 class SamplingTest(parameterized.TestCase):
+    def setUp(self):
+        super().setUp()
+        tf.random.set_seed(1)
+
     @parameterized.parameters(
         {"weights": [1.0, 0.0, 0.0], "expected": ["a", "b", "c", "d", "e"]},
         {"weights": [0.0, 1.0, 0.0], "expected": ["g", "h"]},
         {"weights": [0.0, 0.0, 1.0], "expected": ["w", "x", "y", "z"]},
     )
     def test_sampling_dataset_basic(self, weights, expected):
-        sources = [
-            config_for_function(build_ds_fn).set(
-                texts=["a", "b", "c", "d", "e"],
-            ),
-            config_for_function(build_ds_fn).set(
-                texts=["g", "h"],
-            ),
-            config_for_function(build_ds_fn).set(
-                texts=["w", "x", "y", "z"],
-            ),
-        ]
+        sources = _default_sources()
 
         sampling_ds_cfg = config_for_function(sample_from_datasets).set(
             is_training=False,
@@ -91,6 +88,12 @@ class SamplingTest(parameterized.TestCase):
         actual = list(ds_fn().take(len(expected)))
         self.assertEqual(expected, actual)
 
+    @parameterized.parameters(
+        {"weights": [1.0, 0.0, 0.0]},
+        {"weights": [0.0, 1.0, 0.0]},
+        {"weights": [0.0, 0.0, 1.0]},
+    )
+    def test_sampling_dataset_zero_cardinality(self, weights):
         sources = [
             config_for_function(build_ds_fn).set(
                 texts=["a", "b", "c"],
@@ -115,18 +118,7 @@ class SamplingTest(parameterized.TestCase):
             list(ds_fn().take(1))
 
     def test_sampling_dataset(self):
-        tf.random.set_seed(1)
-        sources = [
-            config_for_function(build_ds_fn).set(
-                texts=["a", "b", "c", "d", "e"],
-            ),
-            config_for_function(build_ds_fn).set(
-                texts=["g", "h"],
-            ),
-            config_for_function(build_ds_fn).set(
-                texts=["w", "x", "y", "z"],
-            ),
-        ]
+        sources = _default_sources()
 
         sampling_ds_cfg = config_for_function(sample_from_datasets).set(
             is_training=False,
@@ -137,21 +129,9 @@ class SamplingTest(parameterized.TestCase):
         ds_fn = sampling_ds_cfg.instantiate()
 
         # Note that dataset ends when a dataset becomes empty.
-        expected = ["a", "g", "w", "h", "b", "c", "d"]
-        actual = [bytes.decode(x.numpy(), "utf-8") for x in ds_fn().take(len(expected))]
-        assert expected == actual
-
-        sources = [
-            config_for_function(build_ds_fn).set(
-                texts=["a", "b", "c", "d", "e"],
-            ),
-            config_for_function(build_ds_fn).set(
-                texts=["g", "h"],
-            ),
-            config_for_function(build_ds_fn).set(
-                texts=["w", "x", "y", "z"],
-            ),
-        ]
+        expected = [b"a", b"g", b"w", b"h", b"b", b"c", b"d"]
+        actual = ds_fn().take(len(expected)).batch(len(expected)).get_single_element()
+        assert expected == actual.numpy().tolist()
 
         sampling_ds_cfg = config_for_function(sample_from_datasets).set(
             is_training=False,
@@ -161,9 +141,9 @@ class SamplingTest(parameterized.TestCase):
         )
         ds_fn = sampling_ds_cfg.instantiate()
 
-        expected = ["g", "w", "x", "h"]
-        actual = [bytes.decode(x.numpy(), "utf-8") for x in ds_fn().take(len(expected))]
-        assert expected == actual
+        expected = [b"g", b"w", b"x", b"h"]
+        actual = ds_fn().take(len(expected)).batch(len(expected)).get_single_element()
+        assert expected == actual.numpy().tolist()
 
 
 class ConcatenateDatasetsTest(parameterized.TestCase):
@@ -180,27 +160,20 @@ class ConcatenateDatasetsTest(parameterized.TestCase):
 
         ds_fn = concatenate_datasets(is_training=False, sources=sources)
 
-        expected = ["a", "b", "c", "d", "e"]
-        actual = [bytes.decode(x.numpy(), "utf-8") for x in ds_fn()]
+        expected = [b"a", b"b", b"c", b"d", b"e"]
+        ds = ds_fn()
+        # The source cardinality should be statically known.
+        self.assertEqual(len(expected), ds.cardinality().numpy())
+        actual = list(ds.as_numpy_iterator())
         assert expected == actual
 
     def test_concatenates_in_order(self):
-        sources = [
-            config_for_function(build_ds_fn).set(
-                texts=["a", "b", "c", "d", "e"],
-            ),
-            config_for_function(build_ds_fn).set(
-                texts=["g", "h"],
-            ),
-            config_for_function(build_ds_fn).set(
-                texts=["w", "x", "y", "z"],
-            ),
-        ]
+        sources = _default_sources()
 
         ds_fn = concatenate_datasets(is_training=False, sources=sources)
 
-        expected = ["a", "b", "c", "d", "e"] + ["g", "h"] + ["w", "x", "y", "z"]
-        actual = [bytes.decode(x.numpy(), "utf-8") for x in ds_fn()]
+        expected = [b"a", b"b", b"c", b"d", b"e"] + [b"g", b"h"] + [b"w", b"x", b"y", b"z"]
+        actual = list(ds_fn().as_numpy_iterator())
         assert expected == actual
 
 
@@ -233,63 +206,6 @@ class TfdsTest(parameterized.TestCase):
         self.assertEqual(read_config.input_context.num_input_pipelines, num_shards)
         self.assertEqual(read_config.input_context.input_pipeline_id, shard_index)
 
-    @parameterized.parameters(
-        ("train", 1024), ("validation", 8), ("train[:512]", 1), ("invalid", None)
-    )
-    @pytest.mark.gs_login  # must annotate within @parameterized.parameters
-    def test_infer_num_shards(self, split: str, expected: Optional[int]):
-        builder = tfds.builder("c4/en", try_gcs=True)
-        self.assertEqual(_infer_num_shards(builder, split), expected)
-
-    @parameterized.parameters(
-        ("validation", 1043), ("test", 1063), ("test[:12]", 12), ("invalid", None)
-    )
-    @pytest.mark.gs_login  # must annotate within @parameterized.parameters
-    def test_infer_num_examples(self, split: str, expected: Optional[int]):
-        builder = tfds.builder("glue/cola:2.0.0", try_gcs=True)
-        self.assertEqual(_infer_num_examples(builder, split), expected)
-
-    @parameterized.parameters(
-        ("validation", 5, True, "even split"),
-        ("validation", 1044, False, "make copy for each host"),
-        ("validation", 1044, True, "raise value error"),
-        ("invalid", 5, True, "even split"),
-    )
-    @pytest.mark.gs_login
-    def test_maybe_shard_examples(
-        self, split: str, required_shards: int, is_training: bool, expected: str
-    ):
-        dataset_name = "glue/cola:2.0.0"
-        builder = tfds.builder(dataset_name, try_gcs=True)
-        read_config = config_for_function(tfds_read_config).set(is_training=is_training)
-        if expected == "raise value error":
-            with self.assertRaises(ValueError):
-                _ = _maybe_shard_examples(
-                    builder=builder,
-                    read_config=read_config,
-                    split=split,
-                    required_shards=required_shards,
-                    is_training=is_training,
-                    dataset_name=dataset_name,
-                )
-        else:
-            per_process_split = _maybe_shard_examples(
-                builder=builder,
-                read_config=read_config,
-                split=split,
-                required_shards=required_shards,
-                is_training=is_training,
-                dataset_name=dataset_name,
-            )
-            if expected == "even split":
-                shard_index = read_config.shard_index or jax.process_index()
-                expected_split = tfds.even_splits(split, n=required_shards, drop_remainder=False)[
-                    shard_index
-                ]
-                self.assertTrue(expected_split == per_process_split)
-            elif expected == "make copy for each host":
-                self.assertTrue(per_process_split == split)
-
     @parameterized.parameters(
         ("validation", True, "sentence", "foobar"),
         ("test", True, "sentence", "barfoo"),
@@ -297,6 +213,7 @@ class TfdsTest(parameterized.TestCase):
         ("test", False, "sentence", "foo foo"),
     )
     @pytest.mark.gs_login
+    @pytest.mark.xdist_group("glue_cola")
     def test_tfds_decoders(self, split: str, is_training: bool, field_name: str, expected: str):
         def tfds_custom_decoder() -> Dict[str, tfds.decode.Decoder]:
             @tfds.decode.make_decoder()
@@ -343,46 +260,115 @@ class TfdsTest(parameterized.TestCase):
         ), "The decoder fn is not of type tfds.decode.base.DecoderFn"
 
 
+# The split inference tests below are pytest functions, so that they can share module-scoped
+# builder fixtures. Unlike the TfdsTest cases above (e.g. test_tfds_decoders, which instantiates its
+# own source per case), they are not collected by absltest.main(), so run this file with pytest.
+#
+# Builders only read (immutable) DatasetInfo, so it's safe to share them across test cases.
+@pytest.fixture(scope="module", name="c4_builder")
+def _c4_builder_fixture() -> tfds.core.DatasetBuilder:
+    return tfds.builder("c4/en", try_gcs=True)
+
+
+@pytest.fixture(scope="module", name="cola_builder")
+def _cola_builder_fixture() -> tfds.core.DatasetBuilder:
+    return tfds.builder("glue/cola:2.0.0", try_gcs=True)
+
+
+@pytest.mark.parametrize(
+    "split, expected", [("train", 1024), ("validation", 8), ("train[:512]", 1), ("invalid", None)]
+)
+@pytest.mark.gs_login
+@pytest.mark.xdist_group("c4_en")
+def test_infer_num_shards(c4_builder, split: str, expected: Optional[int]):
+    assert _infer_num_shards(c4_builder, split) == expected
+
+
+@pytest.mark.parametrize(
+    "split, expected", [("validation", 1043), ("test", 1063), ("test[:12]", 12), ("invalid", None)]
+)
+@pytest.mark.gs_login
+@pytest.mark.xdist_group("glue_cola")
+def test_infer_num_examples(cola_builder, split: str, expected: Optional[int]):
+    assert _infer_num_examples(cola_builder, split) == expected
+
+
+@pytest.mark.parametrize(
+    "split, required_shards, is_training, expected",
+    [
+        ("validation", 5, True, "even split"),
+        ("validation", 1044, False, "make copy for each host"),
+        ("validation", 1044, True, "raise value error"),
+        ("invalid", 5, True, "even split"),
+    ],
+)
+@pytest.mark.gs_login
+@pytest.mark.xdist_group("glue_cola")
+def test_maybe_shard_examples(
+    cola_builder, split: str, required_shards: int, is_training: bool, expected: str
+):
+    dataset_name = "glue/cola:2.0.0"
+    read_config = config_for_function(tfds_read_config).set(is_training=is_training)
+    if expected == "raise value error":
+        with pytest.raises(ValueError):
+            _ = _maybe_shard_examples(
+                builder=cola_builder,
+                read_config=read_config,
+                split=split,
+                required_shards=required_shards,
+                is_training=is_training,
+                dataset_name=dataset_name,
+            )
+    else:
+        per_process_split = _maybe_shard_examples(
+            builder=cola_builder,
+            read_config=read_config,
+            split=split,
+            required_shards=required_shards,
+            is_training=is_training,
+            dataset_name=dataset_name,
+        )
+        if expected == "even split":
+            shard_index = read_config.shard_index or jax.process_index()
+            expected_split = tfds.even_splits(split, n=required_shards, drop_remainder=False)[
+                shard_index
+            ]
+            assert expected_split == per_process_split
+        elif expected == "make copy for each host":
+            assert per_process_split == split
+
+
 def _text_ds(texts: List[str], *, repeat=1) -> tf.data.Dataset:
     # TODO(markblee): consider de-duping these ds_fns.
-    # pylint: disable=duplicate-code
-    def data_gen():
-        for _ in range(repeat):
-            for index, text in enumerate(texts):
-                yield {"text": text, "index": index, "is_valid": True}
-
-    return tf.data.Dataset.from_generator(
-        data_gen,
-        output_signature={
-            "text": tf.TensorSpec(shape=(), dtype=tf.string),
-            "index": tf.TensorSpec(shape=(), dtype=tf.int32),
-            "is_valid": tf.TensorSpec(shape=(), dtype=tf.bool),
-        },
+    return tf.data.Dataset.from_tensor_slices(
+        {
+            "text": tf.tile(tf.constant(texts, dtype=tf.string), [repeat]),
+            "index": tf.tile(tf.range(len(texts), dtype=tf.int32), [repeat]),
+            "is_valid": tf.ones([len(texts) * repeat], dtype=tf.bool),
+        }
     )
-    # pylint: enable=duplicate-code
 
 
-class BatchTest(parameterized.TestCase):
+class BatchTest(parameterized.TestCase, tf.test.TestCase):
     @parameterized.parameters(False, True)
     def test_padding(self, is_training):
         ds = _text_ds(["a", "b", "c"])
         ds = batch(
             global_batch_size=2, is_training=is_training, pad_example_fn=default_pad_example_fn
         )(ds)
-        batch_index = 0
-        for input_batch in ds:
+        expected_count = 10 if is_training else 2
+        batches = list(ds.take(expected_count).as_numpy_iterator())
+        self.assertLen(batches, expected_count)
+        for batch_index, input_batch in enumerate(batches):
             if is_training or batch_index == 0:
-                self.assertSequenceEqual(input_batch["text"].numpy().tolist(), [b"a", b"b"])
-                self.assertSequenceEqual(input_batch["index"].numpy().tolist(), [0, 1])
-                self.assertSequenceEqual(input_batch["is_valid"].numpy().tolist(), [True, True])
+                self.assertAllEqual(input_batch["text"], [b"a", b"b"])
+                self.assertAllEqual(input_batch["index"], [0, 1])
+                self.assertAllEqual(input_batch["is_valid"], [True, True])
             else:
                 # The eval dataset will be padded by empty examples.
-                self.assertSequenceEqual(input_batch["text"].numpy().tolist(), [b"c", b""])
-                self.assertSequenceEqual(input_batch["index"].numpy().tolist(), [2, 0])
-                self.assertSequenceEqual(input_batch["is_valid"].numpy().tolist(), [True, False])
-            batch_index += 1
-            if batch_index >= 10:
-                break
+                self.assertAllEqual(input_batch["text"], [b"c", b""])
+                self.assertAllEqual(input_batch["index"], [2, 0])
+                self.assertAllEqual(input_batch["is_valid"], [True, False])
 
     @parameterized.product(
         is_training=(False, True),
@@ -422,26 +408,25 @@ class BatchTest(parameterized.TestCase):
             pad_example_fn=default_pad_example_fn,
             repeat=repeat,
         )(ds)
-        batch_index = 0
-        for input_batch in ds:
-            if is_training or batch_index % 2 == 0:
-                self.assertSequenceEqual(input_batch["text"].numpy().tolist(), [b"a", b"b"])
-                self.assertSequenceEqual(input_batch["index"].numpy().tolist(), [0, 1])
-            else:
-                # The eval dataset will be padded by empty examples.
-                self.assertSequenceEqual(input_batch["text"].numpy().tolist(), [b"c", b""])
-                self.assertSequenceEqual(input_batch["index"].numpy().tolist(), [2, 0])
-            batch_index += 1
-            if batch_index >= 10:
-                break
         if repeat is None:
             # Repeat indefinitely if is_training, otherwise do not repeat
             # (hence 2 batches after padding).
-            self.assertEqual(10 if is_training else 2, batch_index)
+            expected_count = 10 if is_training else 2
         else:
             # If is_training, we discard remaining examples, hence one batch per epoch.
             # Otherwise we have two batches per epoch.
-            self.assertEqual(repeat if is_training else 2 * repeat, batch_index)
+            expected_count = repeat if is_training else 2 * repeat
+        # Take up to 10 batches, so that we also catch datasets producing too many batches.
+        batches = list(ds.take(10).as_numpy_iterator())
+        self.assertLen(batches, expected_count)
+        for batch_index, input_batch in enumerate(batches):
+            if is_training or batch_index % 2 == 0:
+                self.assertAllEqual(input_batch["text"], [b"a", b"b"])
+                self.assertAllEqual(input_batch["index"], [0, 1])
+            else:
+                # The eval dataset will be padded by empty examples.
+                self.assertAllEqual(input_batch["text"], [b"c", b""])
+                self.assertAllEqual(input_batch["index"], [2, 0])
 
 
 class UnpackTest(test_utils.TestCase):
@@ -483,23 +468,31 @@ class RekeyTest(test_utils.TestCase):
             },
         )
 
+    def _first_batch(self, ds: tf.data.Dataset) -> Dict[str, Any]:
+        # Fetch all examples in a single call, rather than iterating element by element.
+        return next(ds.batch(len(self.DEFAULT_VALUES)).as_numpy_iterator())
+
     def test_rekey_does_nothing_empty_keymap(self):
-        ds = self._ds_fn()
-        ds = rekey({})(ds)
-        for ix, el in enumerate(ds):
-            self.assertEqual(el["key1"], self.DEFAULT_VALUES[ix])
-            self.assertEqual(el["key2"], self.DEFAULT_VALUES[ix])
+        orig_ds = self._ds_fn()
+        ds = rekey({})(orig_ds)
+        self.assertIs(ds, orig_ds)
+        values = [v.encode() for v in self.DEFAULT_VALUES]
+        batched = self._first_batch(ds)
+        self.assertEqual(set(batched.keys()), {"key1", "key2"})
+        self.assertEqual(batched["key1"].tolist(), values)
+        self.assertEqual(batched["key2"].tolist(), values)
 
     def test_rekey_maps_new_keys(self):
         ds = self._ds_fn()
         ds = rekey(
             {"new_key1": "key1", "new_key2": "key2", "new_key3": "key3"}, default_value="no"
         )(ds)
-        for ix, el in enumerate(ds):
-            self.assertEqual(set(el.keys()), {"new_key1", "new_key2", "new_key3"})
-            self.assertEqual(el["new_key1"], self.DEFAULT_VALUES[ix])
-            self.assertEqual(el["new_key2"], self.DEFAULT_VALUES[ix])
-            self.assertEqual(el["new_key3"], "no")
+        values = [v.encode() for v in self.DEFAULT_VALUES]
+        batched = self._first_batch(ds)
+        self.assertEqual(set(batched.keys()), {"new_key1", "new_key2", "new_key3"})
+        self.assertEqual(batched["new_key1"].tolist(), values)
+        self.assertEqual(batched["new_key2"].tolist(), values)
+        self.assertEqual(batched["new_key3"].tolist(), [b"no"] * len(values))
 
     def test_rekey_changes_element_spec(self):
         ds = self._ds_fn()
@@ -516,42 +509,49 @@ class RekeyTest(test_utils.TestCase):
     def test_rekey_maps_falsey_reference_keys_to_default(self):
         ds = self._ds_fn()
         ds = rekey({"new_key1": "key1", "new_key2": None}, default_value="no")(ds)
-        for ix, el in enumerate(ds):
-            self.assertEqual(set(el.keys()), {"new_key1", "new_key2"})
-            self.assertEqual(el["new_key1"], self.DEFAULT_VALUES[ix])
-            self.assertEqual(el["new_key2"], "no")
+        values = [v.encode() for v in self.DEFAULT_VALUES]
+        batched = self._first_batch(ds)
+        self.assertEqual(set(batched.keys()), {"new_key1", "new_key2"})
+        self.assertEqual(batched["new_key1"].tolist(), values)
+        self.assertEqual(batched["new_key2"].tolist(), [b"no"] * len(values))
 
     def test_rekey_maps_original_inputs_if_asked(self):
         ds = self._ds_fn()
         ds = rekey(
             {"new_key1": "key1", "new_key2": None}, default_value="no", retain_original_inputs=True
         )(ds)
-        for ix, el in enumerate(ds):
-            self.assertEqual(set(el.keys()), {"key1", "key2", "new_key1", "new_key2"})
-            self.assertEqual(el["key1"], self.DEFAULT_VALUES[ix])
-            self.assertEqual(el["key2"], self.DEFAULT_VALUES[ix])
-            self.assertEqual(el["new_key1"], self.DEFAULT_VALUES[ix])
-            self.assertEqual(el["new_key2"], "no")
+        values = [v.encode() for v in self.DEFAULT_VALUES]
+        batched = self._first_batch(ds)
+        self.assertEqual(set(batched.keys()), {"key1", "key2", "new_key1", "new_key2"})
+        self.assertEqual(batched["key1"].tolist(), values)
+        self.assertEqual(batched["key2"].tolist(), values)
+        self.assertEqual(batched["new_key1"].tolist(), values)
+        self.assertEqual(batched["new_key2"].tolist(), [b"no"] * len(values))
 
     def test_rekey_does_not_map_missing_reference_keys_with_none_default(self):
         ds = self._ds_fn()
         ds = rekey(
             {"new_key1": "key1", "new_key2": "key2", "new_key3": "key3"}, default_value=None
         )(ds)
-        for ix, el in enumerate(ds):
-            self.assertEqual(set(el.keys()), {"new_key1", "new_key2"})
-            self.assertEqual(el["new_key1"], self.DEFAULT_VALUES[ix])
-            self.assertEqual(el["new_key2"], self.DEFAULT_VALUES[ix])
+        values = [v.encode() for v in self.DEFAULT_VALUES]
+        batched = self._first_batch(ds)
+        self.assertEqual(set(batched.keys()), {"new_key1", "new_key2"})
+        self.assertEqual(batched["new_key1"].tolist(), values)
+        self.assertEqual(batched["new_key2"].tolist(), values)
 
     def test_rekey_does_not_map_falsey_reference_keys_with_none_default(self):
         ds = self._ds_fn()
         ds = rekey({"new_key1": "key1", "new_key2": None}, default_value=None)(ds)
-        for ix, el in enumerate(ds):
-            self.assertEqual(set(el.keys()), {"new_key1"})
-            self.assertEqual(el["new_key1"], self.DEFAULT_VALUES[ix])
+        batched = self._first_batch(ds)
+        self.assertEqual(set(batched.keys()), {"new_key1"})
+        self.assertEqual(batched["new_key1"].tolist(), [v.encode() for v in self.DEFAULT_VALUES])
 
 
 class ProcessorsTest(parameterized.TestCase, tf.test.TestCase):
+    def setUp(self):
+        super().setUp()
+        tf.random.set_seed(1)
+
     def test_processor_for_sample_from_dataset(self):
         def process_fn(is_training: bool, *, add_token: str) -> DatasetToDatasetFn:
             del is_training
@@ -563,7 +563,6 @@ class ProcessorsTest(parameterized.TestCase, tf.test.TestCase):
 
             return process_example_fn
 
-        tf.random.set_seed(1)
         source_cfgs = [
             config_for_function(build_ds_fn).set(
                 texts=["a", "b", "c", "d", "e"],
@@ -608,19 +607,7 @@ class ProcessorsTest(parameterized.TestCase, tf.test.TestCase):
             }
         ]
 
-        def gen():
-            for ex in examples:
-                yield ex
-
-        ds = tf.data.Dataset.from_generator(
-            gen,
-            output_signature={
-                "a": tf.TensorSpec(shape=(2, 1), dtype=tf.int32),
-                "b": tf.TensorSpec(shape=(2, 1), dtype=tf.int32),
-                "c": tf.TensorSpec(shape=(2, 1, 3), dtype=tf.int32),
-                "d": tf.TensorSpec(shape=(1, 2, 1, 3), dtype=tf.int32),
-            },
-        )
+        ds = tf.data.Dataset.from_tensors(examples[0])
 
         processor = (
             config_for_function(squeeze_fields).set(axis=dict(a=1, c=None, d=[0, 2])).instantiate()
@@ -646,18 +633,7 @@ class ProcessorsTest(parameterized.TestCase, tf.test.TestCase):
             }
         ]
 
-        def gen():
-            for ex in examples:
-                yield ex
-
-        ds = tf.data.Dataset.from_generator(
-            gen,
-            output_signature={
-                "a": tf.TensorSpec(shape=(1,), dtype=tf.int32),
-                "b": tf.TensorSpec(shape=(2, 1), dtype=tf.int32),
-                "c": tf.TensorSpec(shape=(2, 1), dtype=tf.int32),
-            },
-        )
+        ds = tf.data.Dataset.from_tensors(examples[0])
 
         # Remove key does not exist in data.
         processor = config_for_function(remove_fields).set(fields=["d"]).instantiate()
@@ -720,7 +696,8 @@ class PreserveElementSpecTest(parameterized.TestCase):
     def test_preserve_element_spec(self):
         @seqio.map_over_dataset
         def mapper(example):
-            example["text"] = tf.py_function(func=lambda x: x, inp=example, Tout=tf.string)
+            # An in-graph identity which drops the static shape.
+            example["text"] = tf.compat.v1.placeholder_with_default(example["text"], shape=None)
             example["label"] = example["text"]
             return example
 
@@ -783,22 +760,31 @@ class PadTest(parameterized.TestCase, tf.test.TestCase):
     @parameterized.parameters(
         dict(
             examples=[
-                {"a": tf.constant([[1, 0, 0], [2, 3, 0], [4, 5, 6]]), "b": tf.constant([1, 2])},
-                {"a": tf.constant([[1, 2, 0]]), "b": tf.constant([3])},
+                {
+                    "a": np.array([[1, 0, 0], [2, 3, 0], [4, 5, 6]], dtype=np.int32),
+                    "b": np.array([1, 2], dtype=np.int32),
+                },
+                {"a": np.array([[1, 2, 0]], dtype=np.int32), "b": np.array([3], dtype=np.int32)},
             ],
             expected=[
                 {
-                    "a": tf.constant([[1, 0, 0], [2, 3, 0], [4, 5, 6], [0, 0, 0], [0, 0, 0]]),
-                    "b": tf.constant([1, 2, 0, 0, 0]),
+                    "a": np.array(
+                        [[1, 0, 0], [2, 3, 0], [4, 5, 6], [0, 0, 0], [0, 0, 0]], dtype=np.int32
+                    ),
+                    "b": np.array([1, 2, 0, 0, 0], dtype=np.int32),
                 },
                 {
-                    "a": tf.constant([[1, 2, 0], [0, 0, 0], [0, 0, 0], [0, 0, 0], [0, 0, 0]]),
-                    "b": tf.constant([3, 0, 0, 0, 0]),
+                    "a": np.array(
+                        [[1, 2, 0], [0, 0, 0], [0, 0, 0], [0, 0, 0], [0, 0, 0]], dtype=np.int32
+                    ),
+                    "b": np.array([3, 0, 0, 0, 0], dtype=np.int32),
                 },
             ],
         ),
     )
-    def test_pad_to_batch(self, examples: Dict[str, tf.Tensor], expected: Dict[str, tf.Tensor]):
+    def test_pad_to_batch(
+        self, examples: Sequence[Dict[str, np.ndarray]], expected: Sequence[Dict[str, np.ndarray]]
+    ):
         processor = pad_to_batch(batch_size=5)
         source = fake_source(
             is_training=False,
@@ -812,66 +798,85 @@ class PadTest(parameterized.TestCase, tf.test.TestCase):
         tf.nest.map_structure(self.assertAllEqual, expected, actual)
 
 
+def _assert_nested_equal(
+    expected: Sequence[Dict[str, tf.Tensor]], actual: Sequence[Dict[str, tf.Tensor]]
+):
+    """Asserts that two sequences of examples are equal, comparing one stacked tensor per key."""
+    tf.nest.assert_same_structure(expected, actual)
+    stacked_expected = tf.nest.map_structure(lambda *xs: tf.stack(xs), *expected)
+    stacked_actual = tf.nest.map_structure(lambda *xs: tf.stack(xs), *actual)
+    for key, value in stacked_expected.items():
+        # tf.debugging.assert_equal broadcasts, so check shapes separately.
+        tf.debugging.assert_equal(tf.shape(value), tf.shape(stacked_actual[key]))
+        tf.debugging.assert_equal(value, stacked_actual[key], message=key)
+
+
+# Example payloads are int32 numpy arrays (like PadTest), so that no tensors are constructed
+# when the test module is imported.
+_PACK_EXAMPLES_1 = [
+    {
+        "a": np.array([[1, 0, 0], [2, 3, 0], [4, 5, 6]], dtype=np.int32),
+        "b": np.array([1, 2], dtype=np.int32),
+    },
+    {"a": np.array([[1, 2, 0]], dtype=np.int32), "b": np.array([3], dtype=np.int32)},
+    {"a": np.array([[3, 0, 0]], dtype=np.int32), "b": np.array([4], dtype=np.int32)},
+    {
+        "a": np.array([[1, 2, 3], [4, 0, 0]], dtype=np.int32),
+        "b": np.array([5, 6, 7, 8], dtype=np.int32),
+    },
+]
+_PACK_EXPECTED_1 = [
+    {
+        "a": np.array([[1, 0, 0], [2, 3, 0], [4, 5, 6], [1, 2, 0], [3, 0, 0]], dtype=np.int32),
+        "b": np.array([1, 2, 3, 4, 0], dtype=np.int32),
+    },
+    {
+        "a": np.array([[1, 2, 3], [4, 0, 0], [0, 0, 0], [0, 0, 0], [0, 0, 0]], dtype=np.int32),
+        "b": np.array([5, 6, 7, 8, 0], dtype=np.int32),
+    },
+]
+_PACK_EXAMPLES_2 = [
+    {
+        "a": np.array([[1, 0, 0], [2, 3, 0], [4, 5, 6]], dtype=np.int32),
+        "b": np.array([1, 2], dtype=np.int32),
+    },
+    {"a": np.array([[1, 2, 0]], dtype=np.int32), "b": np.array([3, 4, 5, 6, 7], dtype=np.int32)},
+]
+_PACK_EXPECTED_2 = [
+    {
+        "a": np.array([[1, 0, 0], [2, 3, 0], [4, 5, 6], [0, 0, 0], [0, 0, 0]], dtype=np.int32),
+        "b": np.array([1, 2, 0, 0, 0], dtype=np.int32),
+    },
+    {
+        "a": np.array([[1, 2, 0], [0, 0, 0], [0, 0, 0], [0, 0, 0], [0, 0, 0]], dtype=np.int32),
+        "b": np.array([3, 4, 5, 6, 7], dtype=np.int32),
+    },
+]
+
+
 class PackTest(parameterized.TestCase, tf.test.TestCase):
     @parameterized.parameters(
-        dict(
-            examples=[
-                {"a": tf.constant([[1, 0, 0], [2, 3, 0], [4, 5, 6]]), "b": tf.constant([1, 2])},
-                {"a": tf.constant([[1, 2, 0]]), "b": tf.constant([3])},
-                {"a": tf.constant([[3, 0, 0]]), "b": tf.constant([4])},
-                {"a": tf.constant([[1, 2, 3], [4, 0, 0]]), "b": tf.constant([5, 6, 7, 8])},
-            ],
-            expected=[
-                {
-                    "a": tf.constant([[1, 0, 0], [2, 3, 0], [4, 5, 6], [1, 2, 0], [3, 0, 0]]),
-                    "b": tf.constant([1, 2, 3, 4, 0]),
-                },
-                {
-                    "a": tf.constant([[1, 2, 3], [4, 0, 0], [0, 0, 0], [0, 0, 0], [0, 0, 0]]),
-                    "b": tf.constant([5, 6, 7, 8, 0]),
-                },
-            ],
-        ),
-        dict(
-            examples=[
-                {"a": tf.constant([[1, 0, 0], [2, 3, 0], [4, 5, 6]]), "b": tf.constant([1, 2])},
-                {"a": tf.constant([[1, 2, 0]]), "b": tf.constant([3, 4, 5, 6, 7])},
-            ],
-            expected=[
-                {
-                    "a": tf.constant([[1, 0, 0], [2, 3, 0], [4, 5, 6], [0, 0, 0], [0, 0, 0]]),
-                    "b": tf.constant([1, 2, 0, 0, 0]),
-                },
-                {
-                    "a": tf.constant([[1, 2, 0], [0, 0, 0], [0, 0, 0], [0, 0, 0], [0, 0, 0]]),
-                    "b": tf.constant([3, 4, 5, 6, 7]),
-                },
-            ],
-        ),
+        dict(examples=_PACK_EXAMPLES_1, expected=_PACK_EXPECTED_1),
+        dict(examples=_PACK_EXAMPLES_2, expected=_PACK_EXPECTED_2),
         # Test a case where each element is multi dimensional.
         dict(
             examples=[
-                {"a": tf.ones([2, 2, 2], dtype=tf.int32)},
-                {"a": tf.ones([3, 2, 2], dtype=tf.int32) * 2},
-                {"a": tf.ones([3, 2, 2], dtype=tf.int32) * 3},
+                {"a": np.ones([2, 2, 2], dtype=np.int32)},
+                {"a": np.ones([3, 2, 2], dtype=np.int32) * 2},
+                {"a": np.ones([3, 2, 2], dtype=np.int32) * 3},
             ],
             expected=[
                 {
-                    "a": tf.concat(
-                        [
-                            tf.ones([2, 2, 2], dtype=tf.int32),
-                            tf.ones([3, 2, 2], dtype=tf.int32) * 2,
-                        ],
-                        0,
+                    "a": np.concatenate(
+                        [np.ones([2, 2, 2], dtype=np.int32), np.ones([3, 2, 2], dtype=np.int32) * 2]
                     ),
                 },
                 {
-                    "a": tf.concat(
+                    "a": np.concatenate(
                         [
-                            tf.ones([3, 2, 2], dtype=tf.int32) * 3,
-                            tf.zeros([2, 2, 2], dtype=tf.int32),
-                        ],
-                        0,
+                            np.ones([3, 2, 2], dtype=np.int32) * 3,
+                            np.zeros([2, 2, 2], dtype=np.int32),
+                        ]
                     ),
                 },
             ],
@@ -880,14 +885,14 @@ class PackTest(parameterized.TestCase, tf.test.TestCase):
         # Test a case where an input element already exceeds batch_size.
         # We should raise in this case.
         dict(
-            examples=[{"a": tf.ones([6, 2], dtype=tf.int32), "b": tf.constant([1])}],
+            examples=[{"a": np.ones([6, 2], dtype=np.int32), "b": np.array([1], dtype=np.int32)}],
             expected=tf.errors.InvalidArgumentError,
         ),
     )
     def test_pack_to_batch(
         self,
-        examples: Sequence[Dict[str, tf.Tensor]],
-        expected: Union[Type[Exception], Sequence[Dict[str, tf.Tensor]]],
+        examples: Sequence[Dict[str, np.ndarray]],
+        expected: Union[Type[Exception], Sequence[Dict[str, np.ndarray]]],
         spec: Optional[Dict] = None,
     ):
         processor = pack_to_batch(batch_size=5)
@@ -902,44 +907,26 @@ class PackTest(parameterized.TestCase, tf.test.TestCase):
         )
         if isinstance(expected, list):
             actual = list(processor(source()))
-            tf.nest.map_structure(self.assertAllEqual, expected, actual)
+            _assert_nested_equal(expected, actual)
         else:
             with self.assertRaises(expected):
                 list(processor(source()))
 
     @parameterized.parameters(
-        dict(
-            examples=[
-                {"a": tf.constant([[1, 0, 0], [2, 3, 0], [4, 5, 6]]), "b": tf.constant([1, 2])},
-                {"a": tf.constant([[1, 2, 0]]), "b": tf.constant([3])},
-                {"a": tf.constant([[3, 0, 0]]), "b": tf.constant([4])},
-                {"a": tf.constant([[1, 2, 3], [4, 0, 0]]), "b": tf.constant([5, 6, 7, 8])},
-            ],
-            expected=[
-                {
-                    "a": tf.constant([[1, 0, 0], [2, 3, 0], [4, 5, 6], [1, 2, 0], [3, 0, 0]]),
-                    "b": tf.constant([1, 2, 3, 4, 0]),
-                },
-                {
-                    "a": tf.constant([[1, 2, 3], [4, 0, 0], [0, 0, 0], [0, 0, 0], [0, 0, 0]]),
-                    "b": tf.constant([5, 6, 7, 8, 0]),
-                },
-            ],
-        ),
+        dict(examples=_PACK_EXAMPLES_1, expected=_PACK_EXPECTED_1),
         # Test a case where an input element already exceeds batch_size.
         # We should trim the batch in this case.
         dict(
-            examples=[{"a": tf.ones([6, 3], dtype=tf.int32), "b": tf.ones([12], dtype=tf.int32)}],
-            expected=[{"a": tf.ones([5, 3], dtype=tf.int32), "b": tf.ones([5], dtype=tf.int32)}],
+            examples=[{"a": np.ones([6, 3], dtype=np.int32), "b": np.ones([12], dtype=np.int32)}],
+            expected=[{"a": np.ones([5, 3], dtype=np.int32), "b": np.ones([5], dtype=np.int32)}],
         ),
     )
     def test_trim_and_pack_to_batch(
         self,
-        examples: Sequence[Dict[str, tf.Tensor]],
-        expected: Sequence[Dict[str, tf.Tensor]],
+        examples: Sequence[Dict[str, np.ndarray]],
+        expected: Sequence[Dict[str, np.ndarray]],
         spec: Optional[Dict] = None,
     ):
-        processor = chain(trim_to_batch(batch_size=5), pack_to_batch(batch_size=5))
         source = fake_source(
             is_training=False,
             examples=examples,
@@ -949,14 +936,21 @@ class PackTest(parameterized.TestCase, tf.test.TestCase):
                 "b": tf.TensorSpec(shape=[None], dtype=tf.int32),
             },
         )
-        actual_ds = processor(source())
-        actual = list(actual_ds)
-        tf.nest.map_structure(self.assertAllEqual, expected, actual)
         expected_element_spec = {
             "a": tf.TensorSpec(shape=(5, 3), dtype=tf.int32, name=None),
             "b": tf.TensorSpec(shape=(5,), dtype=tf.int32, name=None),
         }
-        tf.nest.map_structure(self.assertAllEqual, actual_ds.element_spec, expected_element_spec)
+        # The fused processor should be equivalent to chaining trim and pack.
+        for processor in (
+            chain(trim_to_batch(batch_size=5), pack_to_batch(batch_size=5)),
+            trim_and_pack_to_batch(batch_size=5),
+        ):
+            actual_ds = processor(source())
+            actual = list(actual_ds)
+            _assert_nested_equal(expected, actual)
+            tf.nest.map_structure(
+                self.assertAllEqual, actual_ds.element_spec, expected_element_spec
+            )
 
 
 class ConvertRaggedTensorTest(parameterized.TestCase, tf.test.TestCase):
@@ -978,7 +972,14 @@ class ConvertRaggedTensorTest(parameterized.TestCase, tf.test.TestCase):
             {"a": tf.constant([[1, 0, 0, 0, 0]]), "b": tf.constant([5])},
             {"a": tf.constant([[1, 2, 0, 0, 0]]), "b": tf.constant([5])},
         ]
-        tf.nest.map_structure(self.assertAllEqual, expected, actual)
+        _assert_nested_equal(expected, actual)
+
+    def test_ragged_to_tensor_noop(self):
+        examples = [{"a": tf.constant([[1, 2, 3]]), "b": tf.constant([5])}]
+        ds = fake_source(is_training=False, examples=examples)()
+        processor = ragged_to_tensor(feature_shapes={"a": [None, 5]})
+        # No map is applied if none of the features are ragged.
+        self.assertIs(ds, processor(ds))
 
 
 class TrimAndPadTest(parameterized.TestCase):